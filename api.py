@@ -0,0 +1,195 @@
+import base64
+import binascii
+import json
+from flask import request, Response
+from app import app, db
+from models import User, Game, Comment
+from sharding import shards
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: binary responses for the mobile client
+    msgpack = None
+
+API_PREFIX = '/api/v1'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Public fields -> columns; only the requested columns are loaded
+GAME_COLUMNS = {
+    'id': Game.id,
+    'title': Game.title,
+    'description': Game.description,
+    'genre': Game.genre,
+    'download_link': Game.download_link,
+    'image_url': Game.image_url,
+    'created_at': Game.created_at,
+    'added_by_id': Game.added_by_id,
+}
+GAME_STATS = {'likes', 'dislikes', 'comments'}
+GAME_DEFAULT_FIELDS = list(GAME_COLUMNS) + sorted(GAME_STATS)
+
+COMMENT_COLUMNS = {
+    'id': Comment.id,
+    'content': Comment.content,
+    'created_at': Comment.created_at,
+    'user_id': Comment.user_id,
+    'game_id': Comment.game_id,
+    'username': User.username,
+}
+COMMENT_DEFAULT_FIELDS = list(COMMENT_COLUMNS)
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def api_response(payload, status=200):
+    """Serialize a payload as msgpack or JSON depending on the Accept header"""
+    best = request.accept_mimetypes.best_match(['application/json', 'application/msgpack'])
+    if best == 'application/msgpack' and msgpack is not None:
+        body = msgpack.packb(payload)
+        mimetype = 'application/msgpack'
+    elif orjson is not None:
+        body = orjson.dumps(payload)
+        mimetype = 'application/json'
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+        mimetype = 'application/json'
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+@app.errorhandler(ApiError)
+def api_error(error):
+    return api_response({'error': error.message}, error.status)
+
+def parse_fields(allowed):
+    """Sparse fieldsets: ?fields=id,title (defaults to every field)"""
+    raw = request.args.get('fields', '', type=str)
+    if not raw:
+        return None
+    fields = [f for f in raw.split(',') if f]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def parse_ids(raw):
+    try:
+        ids = [int(i) for i in raw.split(',') if i]
+    except ValueError:
+        raise ApiError('ids must be a comma separated list of integers')
+    if len(ids) > MAX_LIMIT:
+        raise ApiError(f'At most {MAX_LIMIT} ids per request')
+    return list(dict.fromkeys(ids))
+
+def parse_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ApiError('Invalid cursor')
+
+def paginate(query, id_column, limit):
+    """Keyset pagination on descending id; returns (rows, next_cursor)"""
+    cursor = request.args.get('cursor', '', type=str)
+    if cursor:
+        query = query.filter(id_column < decode_cursor(cursor))
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def serialize_games(rows, fields):
+    """Turn game rows into dicts, adding counts from Game.stats_for only if asked"""
+    stat_fields = [f for f in fields if f in GAME_STATS]
+    stats = Game.stats_for([row.id for row in rows]) if stat_fields else {}
+    items = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = stats[row.id][field] if field in GAME_STATS else getattr(row, field)
+            item[field] = value.isoformat() if hasattr(value, 'isoformat') else value
+        items.append(item)
+    return items
+
+def game_query(fields):
+    columns = [GAME_COLUMNS[f] for f in fields if f in GAME_COLUMNS]
+    if 'id' not in fields:
+        columns.insert(0, Game.id)
+    return db.session.query(*columns)
+
+@app.route(f'{API_PREFIX}/games')
+def api_games():
+    """List games, or batch fetch with ?ids=1,2,3 in a single IN query"""
+    fields = parse_fields(GAME_DEFAULT_FIELDS) or GAME_DEFAULT_FIELDS
+    query = game_query(fields)
+
+    ids = request.args.get('ids', '', type=str)
+    if ids:
+        ids = parse_ids(ids)
+        by_id = {row.id: row for row in query.filter(Game.id.in_(ids))}
+        rows = [by_id[i] for i in ids if i in by_id]
+        return api_response({
+            'data': serialize_games(rows, fields),
+            'missing': [i for i in ids if i not in by_id],
+        })
+
+    genre = request.args.get('genre', '', type=str)
+    if genre:
+        query = query.filter(Game.genre == genre)
+
+    rows, next_cursor = paginate(query, Game.id, parse_limit())
+    return api_response({'data': serialize_games(rows, fields), 'next_cursor': next_cursor})
+
+@app.route(f'{API_PREFIX}/games/<int:game_id>')
+def api_game(game_id):
+    fields = parse_fields(GAME_DEFAULT_FIELDS) or GAME_DEFAULT_FIELDS
+    row = game_query(fields).filter(Game.id == game_id).first()
+    if row is None:
+        raise ApiError('Game not found', 404)
+    return api_response({'data': serialize_games([row], fields)[0]})
+
+@app.route(f'{API_PREFIX}/games/<int:game_id>/comments')
+def api_game_comments(game_id):
+    """Comments for a game, newest first, with author names looked up in one query"""
+    if db.session.query(Game.id).filter(Game.id == game_id).first() is None:
+        raise ApiError('Game not found', 404)
+    fields = parse_fields(COMMENT_DEFAULT_FIELDS) or COMMENT_DEFAULT_FIELDS
+    # Comments may live on a shard, so usernames come from the main database separately
+    columns = [Comment.user_id.label('author_id') if f == 'username' else COMMENT_COLUMNS[f] for f in fields]
+    if 'id' not in fields:
+        columns.insert(0, Comment.id)
+    query = shards.for_game(game_id).query(*columns).filter(Comment.game_id == game_id)
+
+    rows, next_cursor = paginate(query, Comment.id, parse_limit())
+    usernames = {}
+    if 'username' in fields:
+        author_ids = {row.author_id for row in rows}
+        usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(author_ids)))
+    data = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = usernames.get(row.author_id) if field == 'username' else getattr(row, field)
+            item[field] = value.isoformat() if hasattr(value, 'isoformat') else value
+        data.append(item)
+    return api_response({'data': data, 'next_cursor': next_cursor})
+
+@app.route(f'{API_PREFIX}/games/<int:game_id>/reactions')
+def api_game_reactions(game_id):
+    if db.session.query(Game.id).filter(Game.id == game_id).first() is None:
+        raise ApiError('Game not found', 404)
+    return api_response({'data': Game.stats_for([game_id])[game_id]})
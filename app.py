@@ -1,6 +1,7 @@
 import os
 import logging
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
@@ -30,6 +31,35 @@ def create_app():
     app.config["UPLOAD_FOLDER"] = "static/uploads"
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
     
+    # Duplicate/spam comment detection
+    app.config["SPAM_ACTION"] = os.environ.get("SPAM_ACTION", "reject")  # reject or flag
+    app.config["SPAM_INDEX_SIZE"] = int(os.environ.get("SPAM_INDEX_SIZE", 50000))
+    app.config["SPAM_MAX_DISTANCE"] = 3  # max SimHash bit difference for a near-duplicate
+    app.config["SPAM_MIN_TOKENS"] = 4  # shorter comments ("nice game!") are never checked
+    app.config["SPAM_GAME_THRESHOLD"] = 3  # same text on this many games counts as spam...
+    app.config["SPAM_MAX_AUTHORS"] = 2  # ...when it comes from at most this many accounts
+    app.config["SPAM_USER_THRESHOLD"] = 3  # same user posting the same text this many times (on other games)
+    
+    # Live updates (Server-Sent Events); set a redis:// URL to share events between processes
+    app.config["LIVE_BACKEND_URL"] = os.environ.get("LIVE_BACKEND_URL", "")
+    app.config["LIVE_HEARTBEAT_SECONDS"] = 15
+    # Each open stream holds a worker thread; close it after this long and let EventSource reconnect
+    app.config["LIVE_STREAM_SECONDS"] = int(os.environ.get("LIVE_STREAM_SECONDS", 300))
+    
+    # Compiled templates are cached on disk so workers skip Jinja compilation on startup
+    app.config["JINJA_CACHE_DIR"] = os.environ.get("JINJA_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache"))
+    os.makedirs(app.config["JINJA_CACHE_DIR"], exist_ok=True)
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(app.config["JINJA_CACHE_DIR"])}
+    # Send template timings in a Server-Timing header (always on in debug mode)
+    app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "0") == "1"
+    
+    # Serve raw static files instead of the built bundles (always the case in debug mode)
+    app.config["ASSETS_DEBUG"] = os.environ.get("ASSETS_DEBUG", "0") == "1"
+    
+    # Comment/reaction partitioning by game: comma-separated database URLs, or a number of SQLite shard files
+    app.config["SHARD_URLS"] = os.environ.get("SHARD_URLS", "")
+    app.config["SHARD_COUNT"] = int(os.environ.get("SHARD_COUNT", 1))
+    
     # Proxy fix for deployment
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
@@ -46,7 +76,9 @@ def create_app():
 app = create_app()
 
 # Import models to ensure tables are created
-from models import User, Game, Comment, GameReaction, UserBan
+from models import User, Game, Comment, GameReaction, UserBan, CommentFingerprint, UserStats
+# Comment/reaction storage routing must be in place before the stats backfill below
+import sharding
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -89,3 +121,8 @@ with app.app_context():
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error creating default accounts: {e}")
+    
+    # Materialized per-user stats for accounts that don't have a row yet
+    created = UserStats.backfill_missing()
+    if created:
+        logging.info(f"User stats created for {created} users")
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import click
+from flask import request, url_for, send_from_directory, abort
+from app import app
+
+try:
+    import brotli
+except ImportError:  # optional: .br siblings are skipped without it
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:  # optional: better CSS minification
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # optional: better JS minification
+    rjsmin = None
+
+# Bundle name (what templates ask for) -> source files under static/
+ASSET_BUNDLES = {
+    'css/style.css': ['css/style.css'],
+    'js/main.js': ['js/main.js'],
+}
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+_CSS_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+_CSS_SKIP_RE = re.compile(rf'({_CSS_STRING_RE.pattern})|/\*.*?\*/', re.S)
+_JS_DOC_COMMENT_RE = re.compile(r'^[ \t]*/\*\*.*?\*/[ \t]*\n', re.S | re.M)
+_JS_LINE_COMMENT_RE = re.compile(r'^[ \t]*//[^\n]*\n', re.M)
+
+def _squeeze_css(css):
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}')
+
+def minify_css(css):
+    """Strip comments and whitespace outside of quoted strings"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(css)
+    css = _CSS_SKIP_RE.sub(lambda match: match.group(1) or '', css)
+    parts = []
+    pos = 0
+    for match in _CSS_STRING_RE.finditer(css):
+        parts.append(_squeeze_css(css[pos:match.start()]))
+        parts.append(match.group(0))
+        pos = match.end()
+    parts.append(_squeeze_css(css[pos:]))
+    return ''.join(parts).strip()
+
+def minify_js(js):
+    """Conservative line-based minifier: drops comment-only lines and indentation.
+
+    Newlines are kept so automatic semicolon insertion behaves exactly as in
+    the source; use rjsmin (installed separately) for tighter output.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(js)
+    js = _JS_DOC_COMMENT_RE.sub('', js)
+    js = _JS_LINE_COMMENT_RE.sub('', js)
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def dist_path(*parts):
+    return os.path.join(app.static_folder, DIST_FOLDER, *parts)
+
+def build_assets():
+    """Write fingerprinted, minified bundles plus .gz/.br siblings and a manifest"""
+    os.makedirs(dist_path(), exist_ok=True)
+    previous = read_manifest()
+    manifest = {}
+    for bundle, sources in ASSET_BUNDLES.items():
+        stem, ext = os.path.splitext(bundle)
+        source = ''
+        for name in sources:
+            with open(os.path.join(app.static_folder, name), encoding='utf-8') as f:
+                source += f.read() + '\n'
+        data = MINIFIERS[ext](source).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f'{os.path.basename(stem)}.{digest}.min{ext}'
+        with open(dist_path(filename), 'wb') as f:
+            f.write(data)
+        with open(dist_path(filename + '.gz'), 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(dist_path(filename + '.br'), 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[bundle] = filename
+
+    # Drop older bundles but keep the previous build's: workers that have not reloaded
+    # the manifest yet and clients holding cached HTML still reference those names
+    keep = {MANIFEST_NAME}
+    for filename in [*manifest.values(), *previous.values()]:
+        keep.update((filename, filename + '.gz', filename + '.br'))
+    for name in os.listdir(dist_path()):
+        if name not in keep:
+            os.remove(dist_path(name))
+
+    # Write then rename so a worker never reads a half-written manifest
+    with open(dist_path(MANIFEST_NAME + '.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(dist_path(MANIFEST_NAME + '.tmp'), dist_path(MANIFEST_NAME))
+    return manifest
+
+def read_manifest():
+    try:
+        with open(dist_path(MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_manifest_cache = {'mtime': None, 'manifest': {}}
+
+def load_manifest():
+    """Cached manifest, re-read whenever manifest.json changes on disk"""
+    try:
+        mtime = os.stat(dist_path(MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != _manifest_cache['mtime']:
+        _manifest_cache['manifest'] = read_manifest() if mtime is not None else {}
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['manifest']
+
+def asset_url(name):
+    """URL of a built bundle, or of the raw static file in debug mode / before a build"""
+    if not (app.debug or app.config['ASSETS_DEBUG']):
+        filename = load_manifest().get(name)
+        if filename:
+            return url_for('dist_asset', filename=filename)
+    return url_for('static', filename=name)
+
+@app.route('/assets/<path:filename>')
+def dist_asset(filename):
+    """Serve a fingerprinted bundle, precompressed when the client accepts it"""
+    # Anything build_assets left in dist/ is servable, including the previous build
+    stem, ext = os.path.splitext(filename)
+    if ext not in MINIFIERS or not os.path.splitext(stem)[1] == '.min' or not os.path.isfile(dist_path(filename)):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = None
+    served = filename
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        # Quality check, not membership: "gzip;q=0" means the client refuses gzip
+        if request.accept_encodings[candidate] > 0 and os.path.exists(dist_path(filename + suffix)):
+            encoding = candidate
+            served = filename + suffix
+            break
+    response = send_from_directory(dist_path(), served, mimetype=mimetype, max_age=31536000,
+                                   download_name=filename)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Content-hashed names never change meaning, so clients never need to revalidate
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Build minified, fingerprinted and precompressed static bundles"""
+    for bundle, filename in build_assets().items():
+        click.echo(f'{bundle} -> {DIST_FOLDER}/{filename}')
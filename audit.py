@@ -0,0 +1,175 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from flask_login import current_user
+from app import app, db
+
+ACTIONS = ['add_game', 'edit_game', 'delete_game', 'delete_comment',
+           'ban_user', 'unban_user', 'assign_role']
+TABLE_PREFIX = 'audit_event_'
+
+# Partition tables live outside db.Model's metadata so create_all never touches them
+audit_metadata = db.MetaData()
+_metadata_lock = threading.Lock()  # the writer thread and dashboard requests both define tables
+
+def partition_name(when):
+    return f'{TABLE_PREFIX}{when:%Y%m}'
+
+def partition_table(name):
+    """Table object for one monthly partition (defined once per name)"""
+    with _metadata_lock:
+        if name in audit_metadata.tables:
+            return audit_metadata.tables[name]
+        return db.Table(
+            name, audit_metadata,
+            db.Column('id', db.Integer, primary_key=True),
+            db.Column('created_at', db.DateTime, nullable=False, index=True),
+            db.Column('actor_id', db.Integer, index=True),
+            db.Column('actor_name', db.String(80)),
+            db.Column('action', db.String(40), nullable=False, index=True),
+            db.Column('target_type', db.String(20), nullable=False),
+            db.Column('target_id', db.Integer),
+            db.Column('details', db.Text),
+            db.Index(f'ix_{name}_target', 'target_type', 'target_id'),
+        )
+
+class AuditLog:
+    """Append-only log of privileged actions.
+
+    Requests only put events on a queue; a background thread writes them in
+    batches, one insert per monthly partition. A batch that keeps failing is
+    retried with backoff and finally appended to a JSON-lines spill file.
+    """
+
+    def __init__(self, app, batch_size=100, flush_interval=2.0, retries=5, retry_delay=1.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.spill_path = os.path.join(app.instance_path, 'audit_spill.jsonl')
+        self._queue = queue.Queue()
+        self._known_partitions = set()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def record(self, action, target_type, target_id, **details):
+        """Queue an event for the current user; never blocks the request"""
+        actor_id = current_user.id if current_user.is_authenticated else None
+        actor_name = current_user.username if current_user.is_authenticated else None
+        self._queue.put({
+            'created_at': datetime.utcnow(),
+            'actor_id': actor_id,
+            'actor_name': actor_name,
+            'action': action,
+            'target_type': target_type,
+            'target_id': target_id,
+            'details': json.dumps(details, default=str, ensure_ascii=False) if details else None,
+        })
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            event = self._queue.get()
+            while event is not None:
+                batch.append(event)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    event = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            stopping = event is None
+            if batch:
+                self._write_with_retry(batch)
+
+    def close(self):
+        """Stop the writer thread after it has written everything queued"""
+        if self._worker is not None:
+            self._queue.put(None)
+            # Long enough for a failing batch to go through its retries and reach the spill file
+            self._worker.join(timeout=10 + self.retry_delay * 2 ** self.retries)
+
+    def _write_with_retry(self, events):
+        delay = self.retry_delay
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._write(events)
+                return
+            except Exception as e:
+                logging.error(f"Error writing {len(events)} audit events (attempt {attempt}/{self.retries}): {e}")
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        self._spill(events)
+
+    def _write(self, events):
+        partitions = {}
+        for event in events:
+            partitions.setdefault(partition_name(event['created_at']), []).append(event)
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                for name, rows in partitions.items():
+                    table = partition_table(name)
+                    if name not in self._known_partitions:
+                        table.create(conn, checkfirst=True)
+                    conn.execute(table.insert(), rows)
+        self._known_partitions.update(partitions)
+
+    def _spill(self, events):
+        """Last resort: keep events on disk so they can be replayed by hand"""
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event, default=str, ensure_ascii=False) + '\n')
+            logging.error(f"Spilled {len(events)} audit events to {self.spill_path}")
+        except OSError as e:
+            logging.critical(f"Lost {len(events)} audit events: {e}")
+
+    def partitions(self):
+        """Existing partition names, newest month first"""
+        names = db.inspect(db.engine).get_table_names()
+        return sorted((n for n in names if n.startswith(TABLE_PREFIX)), reverse=True)
+
+    def query(self, actor_id=None, action=None, target_type=None, target_id=None, limit=50):
+        """Newest events matching the filters, walking partitions back in time"""
+        events = []
+        for name in self.partitions():
+            table = partition_table(name)
+            stmt = db.select(table).order_by(table.c.created_at.desc(), table.c.id.desc())
+            if actor_id is not None:
+                stmt = stmt.where(table.c.actor_id == actor_id)
+            if action:
+                stmt = stmt.where(table.c.action == action)
+            if target_type:
+                stmt = stmt.where(table.c.target_type == target_type)
+            if target_id is not None:
+                stmt = stmt.where(table.c.target_id == target_id)
+            rows = db.session.execute(stmt.limit(limit - len(events))).mappings().all()
+            for row in rows:
+                event = dict(row)
+                event['details'] = json.loads(row['details']) if row['details'] else {}
+                events.append(event)
+            if len(events) >= limit:
+                break
+        return events
+
+audit_log = AuditLog(app)
+atexit.register(audit_log.close)
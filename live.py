@@ -0,0 +1,206 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from flask import Response, request, url_for
+from app import app
+from models import Game
+
+try:
+    import redis
+except ImportError:  # optional: only needed for the cross-process backend
+    redis = None
+
+class InProcessBackend:
+    """Pub/sub between request threads of a single process.
+
+    Messages are numbered and the last few per channel are kept, so a
+    reconnecting client can be sent what it missed since its Last-Event-ID.
+    """
+
+    def __init__(self, queue_size=100, history_size=50):
+        self.queue_size = queue_size
+        self.history_size = history_size
+        self._subscribers = {}
+        self._history = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, last_event_id=None):
+        """Returns (queue of new (id, message) pairs, buffered pairs after last_event_id)"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+            history = self._history.get(channel, ())
+            backlog = [item for item in history if last_event_id is not None and item[0] > last_event_id]
+        return subscriber, backlog
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        self._deliver(channel, next(self._ids), message)
+
+    def _deliver(self, channel, event_id, message):
+        item = (event_id, message)
+        with self._lock:
+            if channel not in self._history:
+                self._history[channel] = deque(maxlen=self.history_size)
+            self._history[channel].append(item)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(item)
+            except queue.Full:
+                # A stalled client must not block the writer; it will catch up on reload
+                pass
+
+class RedisBackend(InProcessBackend):
+    """Relays messages through Redis pub/sub so every worker process sees them"""
+
+    prefix = 'live:'
+
+    def __init__(self, url, queue_size=100, history_size=50):
+        if redis is None:
+            raise RuntimeError('LIVE_BACKEND_URL is set but the redis package is not installed')
+        super().__init__(queue_size, history_size)
+        self._redis = redis.Redis.from_url(url)
+        threading.Thread(target=self._listen, name='live-redis', daemon=True).start()
+
+    def _listen(self):
+        """Relay Redis messages locally, reconnecting with backoff whenever Redis goes away"""
+        delay = 1
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{self.prefix}*')
+                delay = 1
+                for item in pubsub.listen():
+                    channel = item['channel'].decode()[len(self.prefix):]
+                    event_id, message = item['data'].decode().split('\n', 1)
+                    self._deliver(channel, int(event_id), message)
+            except Exception as e:
+                logging.error(f"Live updates lost their Redis connection, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def publish(self, channel, message):
+        # One counter for all processes, so Last-Event-ID means the same thing in every worker
+        event_id = self._redis.incr(f'{self.prefix}event-id')
+        self._redis.publish(f'{self.prefix}{channel}', f'{event_id}\n{message}')
+
+def make_backend(url):
+    if url:
+        return RedisBackend(url)
+    return InProcessBackend()
+
+class LiveBus:
+    """Formats events as Server-Sent Events and hands them to a backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def format(event, data):
+        return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+    def publish(self, channel, event, data):
+        try:
+            self.backend.publish(channel, self.format(event, data))
+        except Exception as e:
+            # Live updates are best effort; the write itself already succeeded
+            logging.error(f"Error publishing {event} to {channel}: {e}")
+
+    def subscribe(self, channel, last_event_id=None):
+        subscriber, backlog = self.backend.subscribe(channel, last_event_id)
+        return channel, subscriber, backlog
+
+    def unsubscribe(self, subscription):
+        channel, subscriber, _ = subscription
+        self.backend.unsubscribe(channel, subscriber)
+
+    def stream(self, subscription, heartbeat, lifetime, snapshot=None):
+        """Yield missed events, then the snapshot, then new events for up to lifetime seconds.
+
+        The snapshot has no id, so the client's Last-Event-ID still points at
+        the last numbered event when it reconnects after the retry delay.
+        """
+        _, subscriber, backlog = subscription
+        deadline = time.monotonic() + lifetime
+        try:
+            yield 'retry: 5000\n\n'
+            for event_id, message in backlog:
+                yield f'id: {event_id}\n{message}'
+            if snapshot:
+                yield snapshot
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event_id, message = subscriber.get(timeout=min(heartbeat, remaining))
+                    yield f'id: {event_id}\n{message}'
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+live_bus = LiveBus(make_backend(app.config['LIVE_BACKEND_URL']))
+
+def game_channel(game_id):
+    return f'game:{game_id}'
+
+def publish_comment_added(comment):
+    """Send a new comment, already formatted like game_detail renders it"""
+    stats = Game.stats_for([comment.game_id])[comment.game_id]
+    live_bus.publish(game_channel(comment.game_id), 'comment_added', {
+        'id': comment.id,
+        'content': comment.content,
+        'created_at': comment.created_at.strftime('%B %d, %Y at %I:%M %p'),
+        'user_id': comment.user.id,
+        'username': comment.user.username,
+        'role': comment.user.role,
+        'profile_image': url_for('static', filename='uploads/' + comment.user.profile_image),
+        'delete_url': url_for('delete_comment', comment_id=comment.id),
+        'comments': stats['comments']
+    })
+
+def publish_comment_deleted(game_id, comment_id):
+    stats = Game.stats_for([game_id])[game_id]
+    live_bus.publish(game_channel(game_id), 'comment_deleted', {
+        'id': comment_id,
+        'comments': stats['comments']
+    })
+
+def publish_reactions(game_id):
+    stats = Game.stats_for([game_id])[game_id]
+    live_bus.publish(game_channel(game_id), 'reactions', {
+        'likes': stats['likes'],
+        'dislikes': stats['dislikes']
+    })
+
+@app.route('/game/<int:game_id>/live')
+def game_live(game_id):
+    """Server-Sent Events feed of new comments and reaction counts for a game"""
+    Game.query.get_or_404(game_id)
+    subscription = live_bus.subscribe(game_channel(game_id), request.headers.get('Last-Event-ID', type=int))
+    try:
+        # Counted after subscribing, so anything newer is already queued behind the snapshot
+        snapshot = live_bus.format('snapshot', Game.stats_for([game_id])[game_id])
+    except Exception:
+        live_bus.unsubscribe(subscription)
+        raise
+    stream = live_bus.stream(subscription, app.config['LIVE_HEARTBEAT_SECONDS'],
+                             app.config['LIVE_STREAM_SECONDS'], snapshot)
+    response = Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # keep nginx from buffering the stream
+    })
+    # A client gone before the first chunk never runs the generator's cleanup
+    response.call_on_close(lambda: live_bus.unsubscribe(subscription))
+    return response
@@ -1,5 +1,7 @@
 from app import app
 import routes
+import api
+import stats
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
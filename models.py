@@ -1,8 +1,16 @@
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
 
+# Comment/GameReaction router, installed by sharding.py through use_shards()
+shards = None
+
+def use_shards(router):
+    global shards
+    shards = router
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -59,10 +67,39 @@ class Game(db.Model):
         return f'<Game {self.title}>'
     
     def get_like_count(self):
-        return GameReaction.query.filter_by(game_id=self.id, reaction_type='like').count()
+        return Game.stats_for([self.id])[self.id]['likes']
     
     def get_dislike_count(self):
-        return GameReaction.query.filter_by(game_id=self.id, reaction_type='dislike').count()
+        return Game.stats_for([self.id])[self.id]['dislikes']
+    
+    @staticmethod
+    def stats_for(game_ids):
+        """Like, dislike and comment counts for many games in two grouped queries per shard"""
+        stats = {game_id: {'likes': 0, 'dislikes': 0, 'comments': 0} for game_id in game_ids}
+        if not stats:
+            return stats
+        groups = shards.group_games(stats)
+        
+        def count(session):
+            ids = groups[session.info.get('shard_index', 0)]
+            reactions = session.query(
+                GameReaction.game_id, GameReaction.reaction_type, db.func.count(GameReaction.id)
+            ).filter(GameReaction.game_id.in_(ids)).group_by(GameReaction.game_id, GameReaction.reaction_type).all()
+            comments = session.query(
+                Comment.game_id, db.func.count(Comment.id)
+            ).filter(Comment.game_id.in_(ids)).group_by(Comment.game_id).all()
+            return reactions, comments
+        
+        for reactions, comments in shards.fan_out(count, shards=groups):
+            for game_id, reaction_type, total in reactions:
+                if reaction_type == 'like':
+                    stats[game_id]['likes'] = total
+                elif reaction_type == 'dislike':
+                    stats[game_id]['dislikes'] = total
+            for game_id, total in comments:
+                stats[game_id]['comments'] = total
+        
+        return stats
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,8 +108,73 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
     
+    # Relationships
+    fingerprint = db.relationship('CommentFingerprint', backref='comment', uselist=False, cascade='all, delete-orphan',
+                                  primaryjoin='Comment.id == foreign(CommentFingerprint.comment_id)')
+    
     def __repr__(self):
         return f'<Comment {self.id}>'
+    
+    @staticmethod
+    def for_game(game_id):
+        """All comments on a game, newest first, from the game's shard"""
+        query = shards.for_game(game_id).query(Comment).filter_by(game_id=game_id)
+        if not shards.enabled:
+            query = query.options(db.joinedload(Comment.user))
+        comments = query.order_by(Comment.created_at.desc()).all()
+        return Comment.load_related(comments) if shards.enabled else comments
+    
+    @staticmethod
+    def recent(limit=10, user_id=None):
+        """Newest comments across all shards, optionally for one user"""
+        
+        def newest(session):
+            query = session.query(Comment)
+            if not shards.enabled:
+                query = query.options(db.joinedload(Comment.user), db.joinedload(Comment.game))
+            if user_id is not None:
+                query = query.filter_by(user_id=user_id)
+            return query.order_by(Comment.created_at.desc()).limit(limit).all()
+        
+        comments = [comment for batch in shards.fan_out(newest) for comment in batch]
+        comments = sorted(comments, key=lambda comment: comment.created_at, reverse=True)[:limit]
+        return Comment.load_related(comments) if shards.enabled else comments
+    
+    @staticmethod
+    def load_related(comments):
+        """Fill in comment.user and comment.game with one IN query each.
+
+        Sharded comments can't join to users and games in the main database,
+        and lazy loading them would cost a query per row.
+        """
+        users = {user.id: user for user in User.query.filter(User.id.in_({c.user_id for c in comments}))}
+        games = {game.id: game for game in Game.query.filter(Game.id.in_({c.game_id for c in comments}))}
+        for comment in comments:
+            set_committed_value(comment, 'user', users.get(comment.user_id))
+            set_committed_value(comment, 'game', games.get(comment.game_id))
+        return comments
+    
+    @staticmethod
+    def total():
+        return sum(shards.fan_out(lambda session: session.query(Comment).count()))
+
+class CommentSequence(db.Model):
+    """Global comment id allocator used while comments are sharded"""
+    __table_args__ = {'sqlite_autoincrement': True}  # never hand out a deleted id again
+    id = db.Column(db.Integer, primary_key=True)
+
+class CommentFingerprint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    comment_id = db.Column(db.Integer, unique=True, nullable=False)  # no FK: the comment may live on a shard
+    user_id = db.Column(db.Integer, nullable=False)  # denormalised so warm-up needs no join
+    game_id = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(40), nullable=False, index=True)  # sha1 of normalised text
+    simhash = db.Column(db.String(16), nullable=False)  # 64-bit SimHash, hex
+    is_flagged = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CommentFingerprint {self.comment_id}>'
 
 class GameReaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -97,3 +199,79 @@ class UserBan(db.Model):
     
     def __repr__(self):
         return f'<UserBan {self.user_id}>'
+
+class UserStats(db.Model):
+    """Per-user activity counters, kept up to date by the write routes"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    comment_count = db.Column(db.Integer, default=0, nullable=False, index=True)
+    likes_given = db.Column(db.Integer, default=0, nullable=False, index=True)
+    dislikes_given = db.Column(db.Integer, default=0, nullable=False)
+    games_added = db.Column(db.Integer, default=0, nullable=False, index=True)
+    bans_received = db.Column(db.Integer, default=0, nullable=False)
+    
+    user = db.relationship('User', backref=db.backref('stats', uselist=False, cascade='all, delete-orphan'))
+    
+    COUNTERS = ('comment_count', 'likes_given', 'dislikes_given', 'games_added', 'bans_received')
+    
+    def __repr__(self):
+        return f'<UserStats {self.user_id}>'
+    
+    @staticmethod
+    def bump(user_id, **deltas):
+        """Apply counter deltas in the current transaction with a single UPDATE.
+
+        Call it after the change itself is in the session: without a stats row
+        the counters are recounted from the source tables instead.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        values = {getattr(UserStats, name): getattr(UserStats, name) + delta for name, delta in deltas.items()}
+        updated = UserStats.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+        if not updated:
+            # No row yet: count from scratch, which already includes the pending change
+            shards.flush()
+            db.session.add(UserStats.compute([user_id])[user_id])
+    
+    @staticmethod
+    def compute(user_ids=None):
+        """Aggregate counters from the source tables; all users when user_ids is None"""
+        if user_ids is None:
+            user_ids = [row.id for row in db.session.query(User.id)]
+        stats = {user_id: UserStats(user_id=user_id, **{name: 0 for name in UserStats.COUNTERS})
+                 for user_id in user_ids}
+        if not stats:
+            return stats
+        
+        def grouped(user_column, *extra, session=db.session):
+            return session.query(user_column, *extra, db.func.count()).filter(
+                user_column.in_(stats)).group_by(user_column, *extra).all()
+        
+        def shard_counts(session):
+            return (grouped(Comment.user_id, session=session),
+                    grouped(GameReaction.user_id, GameReaction.reaction_type, session=session))
+        
+        # Comments and reactions are summed over every shard
+        for comments, reactions in shards.fan_out(shard_counts):
+            for user_id, count in comments:
+                stats[user_id].comment_count += count
+            for user_id, reaction_type, count in reactions:
+                if reaction_type == 'like':
+                    stats[user_id].likes_given += count
+                elif reaction_type == 'dislike':
+                    stats[user_id].dislikes_given += count
+        for user_id, count in grouped(Game.added_by_id):
+            stats[user_id].games_added = count
+        for user_id, count in grouped(UserBan.user_id):
+            stats[user_id].bans_received = count
+        return stats
+    
+    @staticmethod
+    def backfill_missing():
+        """Create rows for users that have none yet (new installs, pre-existing users)"""
+        missing = [row.id for row in db.session.query(User.id).outerjoin(
+            UserStats, UserStats.user_id == User.id).filter(UserStats.user_id.is_(None))]
+        for start in range(0, len(missing), 500):
+            db.session.add_all(UserStats.compute(missing[start:start + 500]).values())
+        db.session.commit()
+        return len(missing)
@@ -0,0 +1,130 @@
+import logging
+import re
+import threading
+from time import perf_counter
+import click
+from flask import g, has_request_context, before_render_template, template_rendered, jsonify, request
+from jinja2 import Template
+from app import app
+from utils import admin_required
+
+_TOKEN_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+class RenderStats:
+    """Process-wide render timings, keyed by template or template#block"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, seconds):
+        with self._lock:
+            count, total, worst = self._stats.get(key, (0, 0.0, 0.0))
+            self._stats[key] = (count + 1, total + seconds, max(worst, seconds))
+
+    def snapshot(self):
+        """{key: {'count', 'total_ms', 'avg_ms', 'max_ms'}} sorted by total time"""
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)
+        return {key: {
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'avg_ms': round(total * 1000 / count, 3),
+            'max_ms': round(worst * 1000, 3)
+        } for key, (count, total, worst) in items}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+render_stats = RenderStats()
+
+def record_timing(key, seconds):
+    render_stats.add(key, seconds)
+    if has_request_context():
+        g.setdefault('render_timings', []).append((key, seconds))
+
+def _timed_block(template, block_name, render):
+    def timed(context, *args, **kwargs):
+        start = perf_counter()
+        try:
+            yield from render(context, *args, **kwargs)
+        finally:
+            # Inclusive: nested blocks are also counted in their parent
+            record_timing(f'{template.name}#{block_name}', perf_counter() - start)
+    return timed
+
+class TimedTemplate(Template):
+    """Template whose blocks report their render time.
+
+    Parent templates pulled in by {% extends %} are loaded through the same
+    environment, so blocks inherited from base.html are timed as well.
+    """
+
+    @property
+    def blocks(self):
+        return self._timed_blocks
+
+    @blocks.setter
+    def blocks(self, blocks):
+        self._timed_blocks = {name: _timed_block(self, name, render) for name, render in blocks.items()}
+
+app.jinja_env.template_class = TimedTemplate
+
+@before_render_template.connect_via(app)
+def _start_render_timer(sender, template, context, **extra):
+    g.setdefault('render_starts', []).append(perf_counter())
+
+@template_rendered.connect_via(app)
+def _stop_render_timer(sender, template, context, **extra):
+    starts = g.get('render_starts')
+    if starts:
+        record_timing(template.name, perf_counter() - starts.pop())
+
+@app.after_request
+def add_server_timing(response):
+    """Expose this request's template timings as a Server-Timing header"""
+    if not (app.debug or app.config['SERVER_TIMING']):
+        return response
+    timings = g.get('render_timings')
+    if timings:
+        entries = [f'tpl-{_TOKEN_UNSAFE_RE.sub("-", key)};dur={seconds * 1000:.2f}' for key, seconds in timings]
+        response.headers.add('Server-Timing', ', '.join(entries))
+        logging.debug('Template timings: ' + ', '.join(entries))
+    return response
+
+def request_memoized(func):
+    """Per-request cache for template helpers called many times per render"""
+    if not has_request_context():
+        return func
+    cache = g.setdefault('template_memo', {})
+    if func not in cache:
+        results = {}
+
+        def memoized(*args):
+            try:
+                return results[args]
+            except KeyError:
+                results[args] = value = func(*args)
+                return value
+            except TypeError:  # unhashable argument
+                return func(*args)
+        cache[func] = memoized
+    return cache[func]
+
+@app.route('/admin/render_stats')
+@admin_required
+def render_stats_view():
+    """This process's template and block timings, slowest in total first; ?reset=1 clears them"""
+    snapshot = render_stats.snapshot()
+    if request.args.get('reset') == '1':
+        render_stats.reset()
+    return jsonify(snapshot)
+
+@app.cli.command('compile-templates')
+def compile_templates():
+    """Compile every template into the bytecode cache"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo(f'Compiled {len(names)} templates into {app.config["JINJA_CACHE_DIR"]}')
@@ -4,10 +4,16 @@ from flask import render_template, url_for, flash, redirect, request, abort, jso
 from flask_login import login_user, current_user, logout_user, login_required
 from werkzeug.security import check_password_hash, generate_password_hash
 from app import app, db
-from models import User, Game, Comment, GameReaction, UserBan
+from models import User, Game, Comment, GameReaction, UserBan, CommentFingerprint, UserStats
 from forms import (LoginForm, RegisterForm, ProfileUpdateForm, PasswordChangeForm, 
                    GameForm, CommentForm, BanForm, AssignRoleForm)
 from utils import save_picture, admin_required, moderator_required, can_manage_games, format_datetime
+from spam import spam_filter
+from live import publish_comment_added, publish_comment_deleted, publish_reactions
+from audit import audit_log, ACTIONS as AUDIT_ACTIONS
+from rendering import request_memoized
+from assets import asset_url
+from sharding import shards
 
 @app.route('/')
 def index():
@@ -31,8 +37,11 @@ def index():
     genres = db.session.query(Game.genre).distinct().all()
     genres = [g[0] for g in genres]
     
+    # Reaction/comment counts for the whole page at once instead of per card
+    game_stats = Game.stats_for([game.id for game in games.items])
+    
     return render_template('index.html', games=games, genres=genres, 
-                         current_genre=genre, search_query=search)
+                         current_genre=genre, search_query=search, game_stats=game_stats)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -83,6 +92,7 @@ def register():
             email=form.email.data,
             password_hash=generate_password_hash(form.password.data)
         )
+        user.stats = UserStats()
         db.session.add(user)
         db.session.commit()
         
@@ -159,22 +169,42 @@ def profile():
     
     return render_template('profile.html', form=form, password_form=password_form)
 
+@app.route('/user/<username>')
+def user_profile(username):
+    """Public activity profile"""
+    user = User.query.filter_by(username=username).first_or_404()
+    stats = user.stats or UserStats.compute([user.id])[user.id]
+    
+    recent_comments = Comment.recent(limit=10, user_id=user.id)
+    recent_games = Game.query.filter_by(added_by_id=user.id).order_by(
+        Game.created_at.desc()).limit(6).all()
+    
+    # Ban history is only shown to staff
+    bans = []
+    if current_user.is_authenticated and current_user.role in ['moderator', 'admin']:
+        bans = UserBan.query.filter_by(user_id=user.id).order_by(
+            UserBan.created_at.desc()).limit(10).all()
+    
+    return render_template('user_profile.html', user=user, stats=stats,
+                         recent_comments=recent_comments, recent_games=recent_games, bans=bans)
+
 @app.route('/game/<int:game_id>')
 def game_detail(game_id):
     """Game detail page"""
     game = Game.query.get_or_404(game_id)
-    comments = Comment.query.filter_by(game_id=game_id).order_by(Comment.created_at.desc()).all()
+    comments = Comment.for_game(game_id)
     
     user_reaction = None
     if current_user.is_authenticated:
-        user_reaction = GameReaction.query.filter_by(
+        user_reaction = shards.for_game(game_id).query(GameReaction).filter_by(
             user_id=current_user.id, game_id=game_id
         ).first()
     
     comment_form = CommentForm()
+    game_stats = Game.stats_for([game_id])[game_id]
     
     return render_template('game_detail.html', game=game, comments=comments, 
-                         user_reaction=user_reaction, form=comment_form)
+                         user_reaction=user_reaction, form=comment_form, game_stats=game_stats)
 
 @app.route('/add_comment/<int:game_id>', methods=['POST'])
 @login_required
@@ -188,13 +218,22 @@ def add_comment(game_id):
     form = CommentForm()
     
     if form.validate_on_submit():
+        verdict = spam_filter.check(form.content.data, current_user.id, game_id)
+        if verdict.is_spam and app.config['SPAM_ACTION'] == 'reject':
+            flash('კომენტარი უარყოფილია: იგივე ტექსტი უკვე გამოქვეყნებულია.', 'danger')
+            return redirect(url_for('game_detail', game_id=game_id))
+        
         comment = Comment(
             content=form.content.data,
             user_id=current_user.id,
             game_id=game_id
         )
-        db.session.add(comment)
-        db.session.commit()
+        spam_filter.record(comment, verdict)
+        shards.for_game(game_id).add(comment)
+        UserStats.bump(current_user.id, comment_count=1)
+        shards.commit()
+        spam_filter.remember(comment)
+        publish_comment_added(comment)
         flash('კომენტარი შემატებულია!', 'success')
     
     return redirect(url_for('game_detail', game_id=game_id))
@@ -210,20 +249,27 @@ def react_to_game(game_id, reaction_type):
         return jsonify({'error': 'Invalid reaction'}), 400
     
     game = Game.query.get_or_404(game_id)
-    existing_reaction = GameReaction.query.filter_by(
+    shard = shards.for_game(game_id)
+    existing_reaction = shard.query(GameReaction).filter_by(
         user_id=current_user.id, game_id=game_id
     ).first()
     
     if existing_reaction:
         if existing_reaction.reaction_type == reaction_type:
             # Remove reaction if same type
-            db.session.delete(existing_reaction)
-            db.session.commit()
+            shard.delete(existing_reaction)
+            UserStats.bump(current_user.id, **{f'{reaction_type}s_given': -1})
+            shards.commit()
             flash('რეაქცია წაშალა!', 'info')
         else:
             # Change reaction type
+            previous_type = existing_reaction.reaction_type
             existing_reaction.reaction_type = reaction_type
-            db.session.commit()
+            UserStats.bump(current_user.id, **{
+                f'{previous_type}s_given': -1,
+                f'{reaction_type}s_given': 1
+            })
+            shards.commit()
             flash(f'რეაქცია შეიცვალა {reaction_type}-ად!', 'success')
     else:
         # Add new reaction
@@ -232,10 +278,12 @@ def react_to_game(game_id, reaction_type):
             user_id=current_user.id,
             game_id=game_id
         )
-        db.session.add(reaction)
-        db.session.commit()
+        shard.add(reaction)
+        UserStats.bump(current_user.id, **{f'{reaction_type}s_given': 1})
+        shards.commit()
         flash(f'შენ მიუტითე {reaction_type} ამ თამაშს!', 'success')
     
+    publish_reactions(game_id)
     return redirect(url_for('game_detail', game_id=game_id))
 
 @app.route('/add_game', methods=['GET', 'POST'])
@@ -254,7 +302,9 @@ def add_game():
             added_by_id=current_user.id
         )
         db.session.add(game)
+        UserStats.bump(current_user.id, games_added=1)
         db.session.commit()
+        audit_log.record('add_game', 'game', game.id, title=game.title)
         flash('თამაში შემატებულია!', 'success')
         return redirect(url_for('index'))
     
@@ -274,6 +324,7 @@ def edit_game(game_id):
         game.download_link = form.download_link.data
         game.image_url = form.image_url.data
         db.session.commit()
+        audit_log.record('edit_game', 'game', game.id, title=game.title)
         flash('თამაში შესრულებულია!', 'success')
         return redirect(url_for('game_detail', game_id=game_id))
     
@@ -285,15 +336,42 @@ def edit_game(game_id):
         form.download_link.data = game.download_link
         form.image_url.data = game.image_url
     
-    return render_template('add_game.html', form=form, game=game)
+    return render_template('add_game.html', form=form, game=game, game_stats=Game.stats_for([game.id])[game.id])
 
 @app.route('/delete_game/<int:game_id>')
 @moderator_required
 def delete_game(game_id):
     """Delete game (moderator/admin only)"""
     game = Game.query.get_or_404(game_id)
+    title = game.title
+    
+    # The game's comments and reactions go with it; count them per author before deleting
+    shard = shards.for_game(game_id)
+    author_id = game.added_by_id
+    comment_counts = shard.query(Comment.user_id, db.func.count()).filter_by(
+        game_id=game_id).group_by(Comment.user_id).all()
+    reaction_counts = shard.query(GameReaction.user_id, GameReaction.reaction_type, db.func.count()).filter_by(
+        game_id=game_id).group_by(GameReaction.user_id, GameReaction.reaction_type).all()
+    comment_ids = [comment_id for (comment_id,) in shard.query(Comment.id).filter_by(game_id=game_id)]
+    
+    # Comments and reactions may sit on a shard, out of reach of the ORM cascade
+    CommentFingerprint.query.filter_by(game_id=game_id).delete()
+    shard.query(Comment).filter_by(game_id=game_id).delete()
+    shard.query(GameReaction).filter_by(game_id=game_id).delete()
     db.session.delete(game)
-    db.session.commit()
+    
+    # One bump per user, after the deletes, so a recount (no stats row yet) sees them exactly once
+    deltas = {author_id: {'games_added': -1}}
+    for user_id, count in comment_counts:
+        deltas.setdefault(user_id, {})['comment_count'] = -count
+    for user_id, reaction_type, count in reaction_counts:
+        deltas.setdefault(user_id, {})[f'{reaction_type}s_given'] = -count
+    for user_id, user_deltas in deltas.items():
+        UserStats.bump(user_id, **user_deltas)
+    shards.commit()
+    for comment_id in comment_ids:
+        spam_filter.forget(comment_id)
+    audit_log.record('delete_game', 'game', game_id, title=title)
     flash('თამაში წაშალა!', 'success')
     return redirect(url_for('index'))
 
@@ -302,20 +380,31 @@ def delete_game(game_id):
 def moderator_dashboard():
     """Moderator dashboard"""
     recent_games = Game.query.order_by(Game.created_at.desc()).limit(10).all()
-    recent_comments = Comment.query.order_by(Comment.created_at.desc()).limit(10).all()
+    recent_comments = Comment.recent(limit=10)
     total_games = Game.query.count()
     total_users = User.query.count()
-    total_comments = Comment.query.count()
+    total_comments = Comment.total()
+    flagged_comments = CommentFingerprint.query.filter_by(is_flagged=True).count()
+    
+    # Which of the recent comments the spam filter flagged, in one query
+    flagged_ids = set()
+    if recent_comments:
+        flagged_ids = {row.comment_id for row in CommentFingerprint.query.filter(
+            CommentFingerprint.comment_id.in_([c.id for c in recent_comments]),
+            CommentFingerprint.is_flagged.is_(True)
+        )}
     
     stats = {
         'total_games': total_games,
         'total_users': total_users,
-        'total_comments': total_comments
+        'total_comments': total_comments,
+        'flagged_comments': flagged_comments
     }
     
     return render_template('moderator_dashboard.html', 
                          recent_games=recent_games,
                          recent_comments=recent_comments,
+                         flagged_ids=flagged_ids,
                          stats=stats)
 
 @app.route('/admin_dashboard')
@@ -324,12 +413,12 @@ def admin_dashboard():
     """Admin dashboard"""
     recent_games = Game.query.order_by(Game.created_at.desc()).limit(10).all()
     recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-    recent_comments = Comment.query.order_by(Comment.created_at.desc()).limit(10).all()
+    recent_comments = Comment.recent(limit=10)
     
     # Statistics
     total_games = Game.query.count()
     total_users = User.query.count()
-    total_comments = Comment.query.count()
+    total_comments = Comment.total()
     total_admins = User.query.filter_by(role='admin').count()
     total_moderators = User.query.filter_by(role='moderator').count()
     banned_users = User.query.filter_by(is_banned=True).count()
@@ -343,11 +432,38 @@ def admin_dashboard():
         'banned_users': banned_users
     }
     
+    # Audit log filters
+    audit_filters = {
+        'actor': request.args.get('actor', '', type=str),
+        'action': request.args.get('action', '', type=str),
+        'target_type': request.args.get('target_type', '', type=str),
+        'target_id': request.args.get('target_id', None, type=int)
+    }
+    actor_id = None
+    if audit_filters['actor']:
+        actor = User.query.filter_by(username=audit_filters['actor']).first()
+        actor_id = actor.id if actor else -1
+    audit_events = audit_log.query(
+        actor_id=actor_id,
+        action=audit_filters['action'] or None,
+        target_type=audit_filters['target_type'] or None,
+        target_id=audit_filters['target_id']
+    )
+    
     return render_template('admin_dashboard.html', 
                          recent_games=recent_games,
                          recent_users=recent_users,
                          recent_comments=recent_comments,
-                         stats=stats)
+                         stats=stats,
+                         audit_events=audit_events,
+                         audit_filters=audit_filters,
+                         audit_actions=AUDIT_ACTIONS)
+
+TOP_CONTRIBUTOR_SORTS = {
+    'comments': UserStats.comment_count,
+    'likes': UserStats.likes_given,
+    'games': UserStats.games_added
+}
 
 @app.route('/manage_users')
 @admin_required
@@ -357,7 +473,15 @@ def manage_users():
     users = User.query.order_by(User.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False)
     
-    return render_template('manage_users.html', users=users)
+    # Top contributors straight from the materialized stats table
+    top_sort = request.args.get('top', 'comments', type=str)
+    sort_column = TOP_CONTRIBUTOR_SORTS.get(top_sort, UserStats.comment_count)
+    top_contributors = db.session.query(User, UserStats).join(
+        UserStats, UserStats.user_id == User.id
+    ).order_by(sort_column.desc(), User.id).limit(10).all()
+    
+    return render_template('manage_users.html', users=users,
+                         top_contributors=top_contributors, top_sort=top_sort)
 
 @app.route('/ban_user/<int:user_id>', methods=['GET', 'POST'])
 @moderator_required
@@ -387,7 +511,10 @@ def ban_user(user_id):
             expires_at=user.ban_expires_at
         )
         db.session.add(ban_record)
+        UserStats.bump(user.id, bans_received=1)
         db.session.commit()
+        audit_log.record('ban_user', 'user', user.id, reason=ban_record.reason,
+                         expires_at=ban_record.expires_at)
         
         flash(f'მომხმარებელი {user.username} დაბანილია 1 დღით.', 'success')
     else:
@@ -410,7 +537,10 @@ def ban_user(user_id):
                 expires_at=expires_at
             )
             db.session.add(ban_record)
+            UserStats.bump(user.id, bans_received=1)
             db.session.commit()
+            audit_log.record('ban_user', 'user', user.id, reason=ban_record.reason,
+                             expires_at=expires_at, permanent=form.permanent.data)
             
             duration_text = "permanently" if form.permanent.data else f"for {form.duration_days.data} days"
             flash(f'მომხმარებელი {user.username} დაბანილია {duration_text}.', 'success')
@@ -427,7 +557,9 @@ def unban_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_banned = False
     user.ban_expires_at = None
+    UserBan.query.filter_by(user_id=user.id, is_active=True).update({'is_active': False})
     db.session.commit()
+    audit_log.record('unban_user', 'user', user.id)
     
     flash(f'მომხმარებელს {user.username} სახწაფე კელ დაუბრუნდა.', 'success')
     return redirect(request.referrer or url_for('manage_users'))
@@ -443,6 +575,7 @@ def assign_role(user_id):
         old_role = user.role
         user.role = form.role.data
         db.session.commit()
+        audit_log.record('assign_role', 'user', user.id, old_role=old_role, new_role=user.role)
         
         flash(f'მომხმარებელის {user.username} როლი შეიცვალა {old_role}-დან {form.role.data}-მდე.', 'success')
         return redirect(url_for('manage_users'))
@@ -451,16 +584,29 @@ def assign_role(user_id):
     if request.method == 'GET':
         form.role.data = user.role
     
-    return render_template('assign_role.html', user=user, form=form)
+    recent_bans = UserBan.query.filter_by(user_id=user.id).order_by(
+        UserBan.created_at.desc()).limit(3).all()
+    
+    return render_template('assign_role.html', user=user, form=form, recent_bans=recent_bans)
 
 @app.route('/delete_comment/<int:comment_id>')
 @moderator_required
 def delete_comment(comment_id):
     """Delete comment (moderator/admin only)"""
-    comment = Comment.query.get_or_404(comment_id)
+    shard = shards.for_comment(comment_id)
+    comment = shard.get(Comment, comment_id)
+    if comment is None:
+        abort(404)
     game_id = comment.game_id
-    db.session.delete(comment)
-    db.session.commit()
+    author_id = comment.user_id
+    excerpt = comment.content[:100]
+    shard.delete(comment)
+    UserStats.bump(author_id, comment_count=-1)
+    shards.commit()
+    audit_log.record('delete_comment', 'comment', comment_id, game_id=game_id,
+                     author_id=author_id, content=excerpt)
+    spam_filter.forget(comment_id)
+    publish_comment_deleted(game_id, comment_id)
     
     flash('კომენტარი წაშალა.', 'success')
     return redirect(url_for('game_detail', game_id=game_id))
@@ -482,4 +628,6 @@ def internal_error(error):
 # Template context processors
 @app.context_processor
 def utility_processor():
-    return dict(format_datetime=format_datetime, can_manage_games=can_manage_games)
+    return dict(format_datetime=request_memoized(format_datetime),
+                can_manage_games=request_memoized(can_manage_games),
+                asset_url=asset_url)
@@ -0,0 +1,233 @@
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import click
+from flask import g
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from app import app, db
+from models import Comment, GameReaction, CommentFingerprint, CommentSequence, UserStats, use_shards
+
+# Tables that grow with traffic and get partitioned by game_id
+SHARDED_MODELS = (Comment, GameReaction)
+
+def shard_urls(config, instance_path):
+    """SHARD_URLS wins; otherwise SHARD_COUNT SQLite files in the instance folder"""
+    if config['SHARD_URLS']:
+        return [url.strip() for url in config['SHARD_URLS'].split(',') if url.strip()]
+    count = config['SHARD_COUNT']
+    if count <= 1:
+        return []
+    folder = os.path.join(instance_path, 'shards')
+    os.makedirs(folder, exist_ok=True)
+    return [f'sqlite:///{os.path.join(folder, f"shard_{i}.db")}' for i in range(count)]
+
+def shard_table_copy(table, metadata):
+    """Copy a table definition without foreign keys; users and games live in the main database"""
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key,
+                         nullable=column.nullable, index=column.name in ('game_id', 'user_id'))
+               for column in table.columns]
+    constraints = [db.UniqueConstraint(*[c.name for c in constraint.columns], name=constraint.name)
+                   for constraint in table.constraints if isinstance(constraint, db.UniqueConstraint)]
+    return db.Table(table.name, metadata, *columns, *constraints)
+
+class ShardSession(Session):
+    """Session for one shard: sharded models go to the shard, everything else to the main database.
+
+    Main-database work runs on db.session's connection, so a comment's
+    fingerprint and the user's stats land in one transaction instead of two
+    connections fighting over SQLite's write lock.
+    """
+
+    def __init__(self, shard_engine, **kwargs):
+        super().__init__(**kwargs)
+        self.shard_engine = shard_engine
+
+    def get_bind(self, mapper=None, **kwargs):
+        if mapper is not None and db.inspect(mapper).class_ in SHARDED_MODELS:
+            return self.shard_engine
+        return db.session.connection()
+
+def allocate_comment_id(session):
+    """Next value of the main database's comment sequence (autoincrement, safe across workers)"""
+    connection = session.connection(bind_arguments={'mapper': db.inspect(CommentSequence)})
+    value = connection.execute(db.insert(CommentSequence)).inserted_primary_key[0]
+    # The row has done its job; the autoincrement counter keeps the value from coming back
+    connection.execute(db.delete(CommentSequence).where(CommentSequence.id == value))
+    return value
+
+@event.listens_for(ShardSession, 'before_flush')
+def _before_shard_flush(session, flush_context, instances):
+    # Comment ids encode their shard (id % count == shard index), so delete_comment/<id>
+    # can find the shard without knowing the game
+    index, count = session.info['shard_index'], session.info['shard_count']
+    pending = session.info.setdefault('pending', {'comments': set(), 'users': set()})
+    for obj in session.new:
+        if isinstance(obj, Comment) and obj.id is None:
+            obj.id = allocate_comment_id(session) * count + index
+            pending['comments'].add(obj.id)
+    # Remember whose counters this transaction touches in case its commit fails (see commit)
+    for obj in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(obj, SHARDED_MODELS):
+            pending['users'].add(obj.user_id)
+
+@event.listens_for(ShardSession, 'after_commit')
+@event.listens_for(ShardSession, 'after_soft_rollback')
+def _clear_pending(session, *args):
+    session.info.pop('pending', None)
+
+class ShardRouter:
+    """Routes Comment/GameReaction access to the shard that owns a game.
+
+    With no shards configured every method hands back db.session, so callers
+    use one code path whether or not partitioning is switched on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.urls = shard_urls(app.config, app.instance_path)
+        self.engines = [create_engine(url, pool_pre_ping=True) for url in self.urls]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix='shard') \
+            if len(self.engines) > 1 else None
+        if self.engines:
+            metadata = db.MetaData()
+            tables = [shard_table_copy(model.__table__, metadata) for model in SHARDED_MODELS]
+            for engine in self.engines:
+                metadata.create_all(engine, tables=tables)
+            logging.info(f"Comment/reaction storage partitioned over {len(self.engines)} shards")
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    @property
+    def count(self):
+        return len(self.engines) or 1
+
+    def shard_for_game(self, game_id):
+        # crc32 spreads sequential ids evenly and is stable across processes and restarts
+        return zlib.crc32(str(game_id).encode()) % self.count
+
+    def shard_for_comment(self, comment_id):
+        return comment_id % self.count
+
+    def session(self, index):
+        if not self.enabled:
+            return db.session
+        sessions = g.setdefault('shard_sessions', {})
+        if index not in sessions:
+            session = ShardSession(self.engines[index])
+            session.info['shard_index'] = index
+            session.info['shard_count'] = self.count
+            sessions[index] = session
+        return sessions[index]
+
+    def for_game(self, game_id):
+        return self.session(self.shard_for_game(game_id))
+
+    def for_comment(self, comment_id):
+        return self.session(self.shard_for_comment(comment_id))
+
+    def sessions(self):
+        return [self.session(index) for index in range(self.count)]
+
+    def fan_out(self, func, shards=None):
+        """Run func(session) on each shard (in parallel when sharded) and return the results"""
+        sessions = [self.session(index) for index in shards] if shards is not None else self.sessions()
+        if self._executor is None or len(sessions) < 2:
+            return [func(session) for session in sessions]
+        # Flush here: autoflush in a worker thread would reach db.session outside the app context
+        for session in sessions:
+            session.flush()
+        return list(self._executor.map(func, sessions))
+
+    def group_games(self, game_ids):
+        """{shard index: [game ids]} for batching per-game lookups"""
+        groups = {}
+        for game_id in game_ids:
+            groups.setdefault(self.shard_for_game(game_id), []).append(game_id)
+        return groups
+
+    def flush(self):
+        for session in g.get('shard_sessions', {}).values():
+            session.flush()
+        db.session.flush()
+
+    def commit(self):
+        """Commit the main database, then every shard used in this request.
+
+        Shards are flushed first so constraint errors surface before anything
+        is committed. If a shard commit still fails afterwards, the main
+        database already holds fingerprints and stats for rows that never
+        landed: those fingerprints are deleted, the affected users' stats are
+        recomputed and the error is re-raised.
+        """
+        sessions = list(g.get('shard_sessions', {}).values())
+        for session in sessions:
+            session.flush()
+        db.session.commit()
+        lost_comments, users = set(), set()
+        error = None
+        for session in sessions:
+            pending = session.info.get('pending', {'comments': set(), 'users': set()})
+            try:
+                session.commit()
+            except Exception as e:
+                logging.error(f"Error committing shard {session.info['shard_index']}: {e}")
+                session.rollback()
+                lost_comments |= pending['comments']
+                users |= pending['users']
+                error = e
+        if error is not None:
+            self._repair(lost_comments, users)
+            raise error
+
+    def _repair(self, comment_ids, user_ids):
+        if comment_ids:
+            CommentFingerprint.query.filter(CommentFingerprint.comment_id.in_(comment_ids)).delete(
+                synchronize_session=False)
+        for stats in UserStats.compute(list(user_ids)).values():
+            db.session.merge(stats)
+        db.session.commit()
+
+    def close(self):
+        for session in g.pop('shard_sessions', {}).values():
+            session.close()
+
+shards = ShardRouter(app)
+use_shards(shards)
+
+@app.teardown_appcontext
+def close_shard_sessions(exception=None):
+    shards.close()
+
+@app.cli.command('shard-data')
+def shard_data():
+    """Move comments and reactions from the main database into the configured shards"""
+    if not shards.enabled:
+        click.echo('No shards configured (set SHARD_COUNT or SHARD_URLS).')
+        return
+    moved_comments = moved_reactions = 0
+    for comment in Comment.query.order_by(Comment.id).all():
+        session = shards.for_game(comment.game_id)
+        old_id = comment.id
+        copy = Comment(content=comment.content, created_at=comment.created_at,
+                       user_id=comment.user_id, game_id=comment.game_id)
+        session.add(copy)
+        session.flush()
+        # New ids come from the shard scheme and may equal an old id not moved yet;
+        # park the fingerprint on the negated id and flip them all at the end
+        CommentFingerprint.query.filter_by(comment_id=old_id).update({'comment_id': -copy.id})
+        db.session.execute(db.delete(Comment.__table__).where(Comment.id == old_id))
+        moved_comments += 1
+    for reaction in GameReaction.query.order_by(GameReaction.id).all():
+        shards.for_game(reaction.game_id).add(GameReaction(
+            reaction_type=reaction.reaction_type, created_at=reaction.created_at,
+            user_id=reaction.user_id, game_id=reaction.game_id))
+        db.session.execute(db.delete(GameReaction.__table__).where(GameReaction.id == reaction.id))
+        moved_reactions += 1
+    CommentFingerprint.query.filter(CommentFingerprint.comment_id < 0).update(
+        {'comment_id': -CommentFingerprint.comment_id})
+    shards.commit()
+    click.echo(f'Moved {moved_comments} comments and {moved_reactions} reactions into {shards.count} shards.')
@@ -0,0 +1,231 @@
+import hashlib
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+import click
+from app import app, db
+from models import Comment, CommentFingerprint
+from sharding import shards
+
+SIMHASH_BITS = 64
+BAND_COUNT = 4  # 4 x 16-bit bands: any pair within 3 bits shares at least one band
+BAND_BITS = SIMHASH_BITS // BAND_COUNT
+BAND_MASK = (1 << BAND_BITS) - 1
+
+_TOKEN_RE = re.compile(r'\w+')
+
+Fingerprint = namedtuple('Fingerprint', 'content_hash simhash token_count')
+IndexEntry = namedtuple('IndexEntry', 'comment_id user_id game_id content_hash simhash')
+SpamVerdict = namedtuple('SpamVerdict', 'fingerprint matches is_spam')
+
+def tokenize(text):
+    """Normalise comment text into a list of lowercase word tokens"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _TOKEN_RE.findall(text)
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(tokens):
+    """64-bit SimHash over word bigrams (single words for very short texts)"""
+    if len(tokens) > 1:
+        features = [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    else:
+        features = tokens
+    if not features:
+        return 0
+    # Transpose the bit strings so each column is counted in C rather than in a Python loop
+    rows = [format(_feature_hash(f), '064b') for f in features]
+    half = len(rows) / 2
+    bits = ''.join('1' if column.count('1') > half else '0' for column in zip(*rows))
+    return int(bits, 2)
+
+def fingerprint(text):
+    """Exact hash and SimHash of a comment's normalised text"""
+    tokens = tokenize(text)
+    content_hash = hashlib.sha1(' '.join(tokens).encode('utf-8')).hexdigest()
+    return Fingerprint(content_hash, simhash(tokens), len(tokens))
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+class FingerprintIndex:
+    """Bounded in-memory index of comment fingerprints with LRU eviction.
+
+    Lookups go through an exact-hash map and four 16-bit SimHash bands, so a
+    query only compares against a handful of candidates instead of every entry.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._by_hash = {}
+        self._bands = [{} for _ in range(BAND_COUNT)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _band_keys(value):
+        return [(value >> (i * BAND_BITS)) & BAND_MASK for i in range(BAND_COUNT)]
+
+    def add(self, entry):
+        with self._lock:
+            if entry.comment_id in self._entries:
+                self._entries.move_to_end(entry.comment_id)
+                return
+            self._entries[entry.comment_id] = entry
+            self._by_hash.setdefault(entry.content_hash, set()).add(entry.comment_id)
+            for band, key in zip(self._bands, self._band_keys(entry.simhash)):
+                band.setdefault(key, set()).add(entry.comment_id)
+            while self.capacity and len(self._entries) > self.capacity:
+                _, evicted = self._entries.popitem(last=False)
+                self._unlink(evicted)
+
+    def remove(self, comment_id):
+        with self._lock:
+            entry = self._entries.pop(comment_id, None)
+            if entry:
+                self._unlink(entry)
+
+    def _unlink(self, entry):
+        ids = self._by_hash.get(entry.content_hash)
+        if ids is not None:
+            ids.discard(entry.comment_id)
+            if not ids:
+                del self._by_hash[entry.content_hash]
+        for band, key in zip(self._bands, self._band_keys(entry.simhash)):
+            ids = band.get(key)
+            if ids is not None:
+                ids.discard(entry.comment_id)
+                if not ids:
+                    del band[key]
+
+    def matches(self, fp, max_distance):
+        """Return entries that are exact or near duplicates of a fingerprint"""
+        with self._lock:
+            candidates = set(self._by_hash.get(fp.content_hash, ()))
+            for band, key in zip(self._bands, self._band_keys(fp.simhash)):
+                candidates.update(band.get(key, ()))
+            found = []
+            for comment_id in candidates:
+                entry = self._entries[comment_id]
+                if (entry.content_hash == fp.content_hash
+                        or hamming_distance(entry.simhash, fp.simhash) <= max_distance):
+                    # Text that keeps getting reposted stays hot in the LRU
+                    self._entries.move_to_end(comment_id)
+                    found.append(entry)
+            return found
+
+class SpamFilter:
+    """Duplicate/spam detection for the comment write path"""
+
+    def __init__(self, config):
+        self.config = config
+        self.index = FingerprintIndex(config['SPAM_INDEX_SIZE'])
+
+    def is_spam(self, matches, user_id, game_id):
+        # Same user reposting on the same game or over and over, or a handful of accounts
+        # spreading the text over many games. Many unrelated authors sharing a phrase is
+        # just a common phrase ("this game is really fun").
+        own = [match for match in matches if match.user_id == user_id]
+        if any(match.game_id == game_id for match in own):
+            return True
+        if len(own) + 1 >= self.config['SPAM_USER_THRESHOLD']:
+            return True
+        authors = {match.user_id for match in matches} | {user_id}
+        if len(authors) > self.config['SPAM_MAX_AUTHORS']:
+            return False
+        games = {match.game_id for match in matches}
+        games.add(game_id)
+        return len(games) >= self.config['SPAM_GAME_THRESHOLD']
+
+    def check(self, content, user_id, game_id):
+        """Fingerprint a new comment and look it up in the index"""
+        fp = fingerprint(content)
+        if fp.token_count < self.config['SPAM_MIN_TOKENS']:
+            return SpamVerdict(None, [], False)
+        matches = self.index.matches(fp, self.config['SPAM_MAX_DISTANCE'])
+        return SpamVerdict(fp, matches, self.is_spam(matches, user_id, game_id))
+
+    def record(self, comment, verdict):
+        """Attach the persisted fingerprint to a comment that is about to be saved"""
+        if verdict.fingerprint is None:
+            return
+        comment.fingerprint = CommentFingerprint(
+            user_id=comment.user_id,
+            game_id=comment.game_id,
+            content_hash=verdict.fingerprint.content_hash,
+            simhash=format(verdict.fingerprint.simhash, '016x'),
+            is_flagged=verdict.is_spam
+        )
+
+    def remember(self, comment):
+        """Add a committed comment's fingerprint to the in-memory index"""
+        if comment.fingerprint is not None:
+            self.index.add(_entry_from_row(comment.fingerprint))
+
+    def forget(self, comment_id):
+        self.index.remove(comment_id)
+
+    def warm(self):
+        """Reload the most recent fingerprints after a restart"""
+        rows = CommentFingerprint.query.order_by(CommentFingerprint.id.desc()).limit(
+            self.index.capacity).all()
+        for row in reversed(rows):
+            self.index.add(_entry_from_row(row))
+        logging.info(f"Spam index warmed with {len(rows)} fingerprints")
+
+def _entry_from_row(row):
+    return IndexEntry(row.comment_id, row.user_id, row.game_id, row.content_hash, int(row.simhash, 16))
+
+spam_filter = SpamFilter(app.config)
+
+with app.app_context():
+    spam_filter.warm()
+
+@app.cli.command('scan-spam')
+@click.option('--backfill', is_flag=True, help='Persist fingerprints for comments that have none.')
+@click.option('--flag', is_flag=True, help='Mark detected duplicates as flagged.')
+def scan_spam(backfill, flag):
+    """Scan existing comments for near-duplicates"""
+    index = FingerprintIndex()
+    max_distance = app.config['SPAM_MAX_DISTANCE']
+    scanned = detected = 0
+    # Fingerprints live in the main database and comments possibly on shards: load them
+    # separately and walk every shard's comments merged back into global id order
+    fingerprints = {row.comment_id: row for row in CommentFingerprint.query}
+    streams = [session.query(Comment).order_by(Comment.id).yield_per(1000) for session in shards.sessions()]
+    for comment in heapq.merge(*streams, key=lambda comment: comment.id):
+        scanned += 1
+        fp = fingerprint(comment.content)
+        if fp.token_count < app.config['SPAM_MIN_TOKENS']:
+            continue
+        matches = index.matches(fp, max_distance)
+        is_spam = spam_filter.is_spam(matches, comment.user_id, comment.game_id)
+        if is_spam:
+            detected += 1
+            click.echo(f'comment {comment.id} (user {comment.user_id}, game {comment.game_id}) '
+                       f'duplicates {sorted(m.comment_id for m in matches)}')
+        row = fingerprints.get(comment.id)
+        if row is None and backfill:
+            row = CommentFingerprint(
+                comment_id=comment.id,
+                user_id=comment.user_id,
+                game_id=comment.game_id,
+                content_hash=fp.content_hash,
+                simhash=format(fp.simhash, '016x')
+            )
+            db.session.add(row)
+        if row is not None and flag and is_spam:
+            row.is_flagged = True
+        index.add(IndexEntry(comment.id, comment.user_id, comment.game_id, fp.content_hash, fp.simhash))
+    shards.commit()
+    if backfill:
+        spam_filter.warm()
+    click.echo(f'Scanned {scanned} comments, {detected} near-duplicates found.')
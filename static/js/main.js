@@ -25,6 +25,9 @@ function initializeComponents() {
     
     // Initialize search functionality
     initializeSearch();
+    
+    // Initialize live comment/reaction updates
+    initializeLiveUpdates();
 }
 
 /**
@@ -459,6 +462,111 @@ function toggleNoResultsMessage(items, query) {
     }
 }
 
+/**
+ * Subscribe to the game's live feed (Server-Sent Events)
+ */
+function initializeLiveUpdates() {
+    const section = document.getElementById('comments-section');
+    if (!section || !section.dataset.liveUrl || !window.EventSource) return;
+    
+    const source = new EventSource(section.dataset.liveUrl);
+    
+    source.addEventListener('comment_added', function(event) {
+        const data = JSON.parse(event.data);
+        addLiveComment(section, data);
+        setLiveCount('.live-comment-count', data.comments);
+    });
+    
+    source.addEventListener('comment_deleted', function(event) {
+        const data = JSON.parse(event.data);
+        const comment = document.getElementById('comment-' + data.id);
+        if (comment) comment.remove();
+        setLiveCount('.live-comment-count', data.comments);
+    });
+    
+    source.addEventListener('reactions', function(event) {
+        const data = JSON.parse(event.data);
+        setLiveCount('.live-like-count', data.likes);
+        setLiveCount('.live-dislike-count', data.dislikes);
+    });
+    
+    // Sent on every (re)connect, after any missed events have been replayed
+    source.addEventListener('snapshot', function(event) {
+        const data = JSON.parse(event.data);
+        setLiveCount('.live-like-count', data.likes);
+        setLiveCount('.live-dislike-count', data.dislikes);
+        setLiveCount('.live-comment-count', data.comments);
+    });
+    
+    window.addEventListener('beforeunload', () => source.close());
+}
+
+/**
+ * Update every element showing a live counter
+ */
+function setLiveCount(selector, value) {
+    document.querySelectorAll(selector).forEach(element => {
+        element.textContent = value;
+    });
+}
+
+/**
+ * Insert a comment received from the live feed at the top of the list
+ */
+function addLiveComment(section, data) {
+    const list = document.getElementById('comment-list');
+    if (!list || document.getElementById('comment-' + data.id)) return;
+    
+    const placeholder = document.getElementById('no-comments');
+    if (placeholder) placeholder.remove();
+    
+    const roleBadge = data.role === 'admin' ? 'danger' : data.role === 'moderator' ? 'warning' : 'secondary';
+    const viewerRole = section.dataset.viewerRole;
+    const canDelete = viewerRole === 'moderator' || viewerRole === 'admin' ||
+                      section.dataset.viewerId === String(data.user_id);
+    
+    const comment = document.createElement('div');
+    comment.className = 'comment mb-3 pb-3 border-bottom';
+    comment.id = 'comment-' + data.id;
+    comment.innerHTML = `
+        <div class="d-flex justify-content-between align-items-start">
+            <div class="d-flex">
+                <img class="profile-img-comment rounded-circle me-3">
+                <div>
+                    <h6 class="mb-1">
+                        <span class="comment-author"></span>
+                        <span class="badge bg-${roleBadge} ms-2 comment-role"></span>
+                    </h6>
+                    <small class="text-muted comment-date"></small>
+                    <p class="mt-2 mb-0 comment-content"></p>
+                </div>
+            </div>
+        </div>
+    `;
+    
+    // User supplied values go in as text, never as markup
+    const image = comment.querySelector('img');
+    image.src = data.profile_image;
+    image.alt = data.username;
+    comment.querySelector('.comment-author').textContent = data.username;
+    comment.querySelector('.comment-role').textContent = data.role.charAt(0).toUpperCase() + data.role.slice(1);
+    comment.querySelector('.comment-date').textContent = data.created_at;
+    comment.querySelector('.comment-content').textContent = data.content;
+    
+    if (canDelete) {
+        const remove = document.createElement('a');
+        remove.href = data.delete_url;
+        remove.className = 'btn btn-outline-danger btn-sm';
+        remove.innerHTML = '<i class="fas fa-trash"></i>';
+        remove.addEventListener('click', function(event) {
+            if (!confirm('Are you sure you want to delete this comment?')) event.preventDefault();
+        });
+        comment.firstElementChild.appendChild(remove);
+    }
+    
+    list.prepend(comment);
+}
+
 /**
  * Setup animations
  */
@@ -0,0 +1,12 @@
+import click
+from app import app, db
+from models import UserStats
+
+@app.cli.command('rebuild-user-stats')
+def rebuild_user_stats():
+    """Recompute every user's stats row from the source tables"""
+    UserStats.query.delete()
+    stats = UserStats.compute()
+    db.session.add_all(stats.values())
+    db.session.commit()
+    click.echo(f'Rebuilt stats for {len(stats)} users.')